@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import itertools
+
+from logger_config import logger
+from text_utils import is_confirmation_reply
+
+# === Настройки контроля нагрузки ===
+
+# Максимальное число ходов в глобальной очереди (ожидающих обработки)
+QUEUE_MAX_SIZE = int(os.getenv("ADMISSION_QUEUE_MAX_SIZE", "32"))
+# История диалога агента (ai_agent.chat_history) общая и не защищена от параллельной записи,
+# поэтому ходы агента выполняются строго по одному
+WORKERS_COUNT = 1
+# Сколько сообщений одной сессии может ждать своей очереди за уже выполняющимся ходом
+SESSION_MAX_PENDING = int(os.getenv("ADMISSION_SESSION_MAX_PENDING", "2"))
+# Оценка длительности хода, пока нет реальных замеров (секунды)
+DEFAULT_SERVICE_TIME = 10.0
+
+PRIORITY_CONFIRMATION = 0
+PRIORITY_DEFAULT = 1
+
+
+class AdmissionRejected(Exception):
+    """Запрос отклонён: очередь переполнена или у сессии слишком много ожидающих сообщений."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Контроль нагрузки перед агентом:
+    - у каждой сессии одновременно выполняется не больше одного хода, остальные ждут своей очереди;
+    - все ходы проходят через общую ограниченную очередь с приоритетом для ответов «да / нет»;
+    - при переполнении очереди запрос сразу отклоняется с рекомендуемым Retry-After.
+    """
+
+    def __init__(self, handler, queue_max_size=QUEUE_MAX_SIZE, workers_count=WORKERS_COUNT,
+                 session_max_pending=SESSION_MAX_PENDING, error_reply=None):
+        self.handler = handler
+        # Ответ обработчика, означающий ошибку хода (агент не бросает исключения, а возвращает текст)
+        self.error_reply = error_reply
+        self.queue_max_size = queue_max_size
+        self.workers_count = workers_count
+        self.session_max_pending = session_max_pending
+
+        self.queue = None
+        self.workers = []
+        self.running = False
+        self.session_locks = {}
+        self.session_pending = {}
+        # Ходы, уже принятые, но ещё ждущие завершения предыдущего хода своей сессии
+        self.waiting_for_session = 0
+        self.in_flight = 0
+        self._sequence = itertools.count()
+
+        self.stats = {
+            "accepted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected_queue_full": 0,
+            "rejected_session_busy": 0,
+            "confirmations_prioritized": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "session_wait_time_total": 0.0,
+            "queue_wait_time_total": 0.0,
+            "service_time_total": 0.0,
+        }
+
+    async def start(self):
+        self.queue = asyncio.PriorityQueue(maxsize=self.queue_max_size)
+        self.running = True
+        self.workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers_count)
+        ]
+        logger.info(f"admission | ✅ Запущено воркеров: {self.workers_count}, размер очереди: {self.queue_max_size}")
+
+    async def stop(self):
+        """
+        Останавливает воркеров. Все ещё не обработанные ходы завершаются с AdmissionRejected,
+        чтобы ожидающие их запросы не зависли.
+        """
+        self.running = False
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        while self.queue is not None and not self.queue.empty():
+            *_, future = self.queue.get_nowait()
+            self._reject_future(future)
+            self.queue.task_done()
+
+    def _reject_future(self, future):
+        if not future.done():
+            future.set_exception(AdmissionRejected("stopped", self.retry_after()))
+
+    def queue_load(self) -> int:
+        """Число принятых, но ещё не взятых в работу ходов (в очереди и в ожидании своей сессии)."""
+        depth = self.queue.qsize() if self.queue else 0
+        return depth + self.waiting_for_session
+
+    def retry_after(self) -> int:
+        """
+        Оценка времени (секунды), через которое в очереди освободится место:
+        место освобождается, как только любой воркер возьмёт следующий ход.
+        """
+        completed = self.stats["completed"] + self.stats["failed"]
+        avg_service = (
+            self.stats["service_time_total"] / completed if completed else DEFAULT_SERVICE_TIME
+        )
+        return max(1, int(avg_service / max(1, self.workers_count)))
+
+    async def submit(self, session_id: str, message: str) -> str:
+        """
+        Поставить ход сессии в очередь и дождаться ответа агента.
+        Бросает AdmissionRejected, если ход принять нельзя.
+        """
+        if not self.running:
+            raise AdmissionRejected("stopped", self.retry_after())
+
+        pending = self.session_pending.get(session_id, 0)
+        if pending > self.session_max_pending:
+            self.stats["rejected_session_busy"] += 1
+            logger.warning(f"admission | ⛔ Сессия {session_id} превысила лимит ожидающих сообщений")
+            raise AdmissionRejected("session_busy", self.retry_after())
+
+        # Место в очереди резервируется сразу, ещё до ожидания своей сессии,
+        # чтобы отказ при переполнении приходил без задержки
+        if self.queue_load() >= self.queue_max_size:
+            self.stats["rejected_queue_full"] += 1
+            logger.warning(f"admission | ⛔ Очередь переполнена ({self.queue_load()})")
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        accepted_at = time.monotonic()
+        self.session_pending[session_id] = pending + 1
+        self.waiting_for_session += 1
+        lock = self.session_locks.setdefault(session_id, asyncio.Lock())
+        reserved = True
+        try:
+            # Один ход на сессию: следующие сообщения ждут завершения текущего
+            async with lock:
+                self.waiting_for_session -= 1
+                reserved = False
+                return await self._enqueue(message, accepted_at)
+        finally:
+            if reserved:
+                self.waiting_for_session -= 1
+            self.session_pending[session_id] -= 1
+            if self.session_pending[session_id] == 0:
+                del self.session_pending[session_id]
+                if not lock.locked():
+                    self.session_locks.pop(session_id, None)
+
+    async def _enqueue(self, message: str, accepted_at: float) -> str:
+        if not self.running:
+            raise AdmissionRejected("stopped", self.retry_after())
+
+        priority = PRIORITY_DEFAULT
+        if is_confirmation_reply(message):
+            priority = PRIORITY_CONFIRMATION
+
+        future = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._sequence), accepted_at, time.monotonic(), message, future)
+        # Место уже зарезервировано в submit, поэтому очередь здесь не переполняется
+        self.queue.put_nowait(item)
+
+        self.stats["accepted"] += 1
+        if priority == PRIORITY_CONFIRMATION:
+            self.stats["confirmations_prioritized"] += 1
+        return await future
+
+    async def _worker(self, worker_id: int):
+        while True:
+            _, _, accepted_at, enqueued_at, message, future = await self.queue.get()
+            # Полное ожидание: от приёма запроса (включая ожидание своей сессии) до начала хода
+            now = time.monotonic()
+            wait_time = now - accepted_at
+            self.stats["wait_time_total"] += wait_time
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], wait_time)
+            self.stats["session_wait_time_total"] += enqueued_at - accepted_at
+            self.stats["queue_wait_time_total"] += now - enqueued_at
+
+            if future.cancelled():
+                self.queue.task_done()
+                continue
+
+            self.in_flight += 1
+            started_at = time.monotonic()
+            try:
+                # Агент синхронный — выполняем его в потоке, чтобы не блокировать event loop
+                reply = await asyncio.to_thread(self.handler, message)
+                if self.error_reply is not None and reply == self.error_reply:
+                    self.stats["failed"] += 1
+                else:
+                    self.stats["completed"] += 1
+                if not future.done():
+                    future.set_result(reply)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.exception(f"admission | ❌ Воркер {worker_id}: ошибка при обработке хода: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            except asyncio.CancelledError:
+                # Остановка во время хода: ответ агента уже не дождаться
+                self._reject_future(future)
+                raise
+            finally:
+                self.stats["service_time_total"] += time.monotonic() - started_at
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    def get_stats(self) -> dict:
+        processed = self.stats["completed"] + self.stats["failed"]
+        dequeued = self.stats["accepted"] - (self.queue.qsize() if self.queue else 0)
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "waiting_for_session": self.waiting_for_session,
+            "queue_max_size": self.queue_max_size,
+            "in_flight": self.in_flight,
+            "workers": self.workers_count,
+            "sessions_waiting": len(self.session_pending),
+            "accepted": self.stats["accepted"],
+            "completed": self.stats["completed"],
+            "failed": self.stats["failed"],
+            "rejected_queue_full": self.stats["rejected_queue_full"],
+            "rejected_session_busy": self.stats["rejected_session_busy"],
+            "confirmations_prioritized": self.stats["confirmations_prioritized"],
+            "wait_time_avg": self.stats["wait_time_total"] / dequeued if dequeued > 0 else 0.0,
+            "wait_time_max": self.stats["wait_time_max"],
+            "session_wait_time_avg": self.stats["session_wait_time_total"] / dequeued if dequeued > 0 else 0.0,
+            "queue_wait_time_avg": self.stats["queue_wait_time_total"] / dequeued if dequeued > 0 else 0.0,
+            "service_time_avg": self.stats["service_time_total"] / processed if processed else 0.0,
+            "retry_after": self.retry_after(),
+        }
@@ -12,10 +12,19 @@ from langchain.messages import HumanMessage, AIMessage, SystemMessage
 
 from get_context import get_context_for_answer
 from logger_config import logger
+from speculative import (
+    SPECULATIVE_RETRIEVAL,
+    speculative_slot,
+    start_speculative_context,
+    take_speculative_context,
+    finish_speculative_context,
+)
 
 load_dotenv()
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 
+AGENT_ERROR_REPLY = "Произошла ошибка при обработке запроса."
+
 chat_history = []
 
 DEPOSIT_RATES = [
@@ -215,6 +224,10 @@ def get_context_tool(arg: str) -> str:
     if not query:
         return "❌ Не указан параметр 'query'."
 
+    context = take_speculative_context(query)
+    if context is not None:
+        return f"Контекст: {context}"
+
     try:
         context = get_context_for_answer(query)
         return f"Контекст: {context}"
@@ -278,6 +291,13 @@ system_prompt = """
 """
 
 
+if SPECULATIVE_RETRIEVAL:
+    # Контекст ищется заранее по сообщению пользователя — просим агента не перефразировать вопрос
+    system_prompt += """
+Вызывая GetContext, передавай в query вопрос пользователя дословно, если он понятен без истории диалога.
+"""
+
+
 agent = create_agent(
     model=llm,
     tools=tools,
@@ -291,9 +311,17 @@ def get_ai_reply(message: str) -> str:
     Отправляет сообщение агенту и возвращает чистый текст ответа.
     """
     
+    slot = None
+    token = None
     try:
         global chat_history
         
+        try:
+            slot = start_speculative_context(message, get_context_for_answer)
+        except Exception:
+            logger.exception("[Agent] Не удалось запустить спекулятивный поиск контекста:")
+        token = speculative_slot.set(slot)
+        
         
         logger.info({"user_message": message})
         
@@ -323,7 +351,11 @@ def get_ai_reply(message: str) -> str:
         return agent_answer
     except Exception as e:
         logger.exception("[Agent] Ошибка при запросе к LLM:")
-        return "Произошла ошибка при обработке запроса."
+        return AGENT_ERROR_REPLY
+    finally:
+        if token is not None:
+            speculative_slot.reset(token)
+        finish_speculative_context(slot)
 
 
 
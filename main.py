@@ -2,8 +2,11 @@ from fastapi import FastAPI, Request, Response, Body
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import uuid
+from contextlib import asynccontextmanager
 from schemas import ChatRequest, ChatResponse
-from ai_agent import get_ai_reply
+from ai_agent import get_ai_reply, AGENT_ERROR_REPLY
+from speculative import get_speculative_stats
+from admission import AdmissionController, AdmissionRejected
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -22,7 +25,17 @@ formatter = logging.Formatter(
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
-app = FastAPI()
+admission = AdmissionController(get_ai_reply, error_reply=AGENT_ERROR_REPLY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await admission.start()
+    yield
+    await admission.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 chat_history = {}
 server_state = {"deposits": []}
@@ -41,11 +54,29 @@ async def chat(request: Request, response: Response, payload: ChatRequest):
 
     history = chat_history.setdefault(session_id, [])
 
-    reply = get_ai_reply(payload.message)
+    try:
+        reply = await admission.submit(session_id, payload.message)
+    except AdmissionRejected as e:
+        logger.warning(f"⛔ /chat отклонён ({e.reason}), Retry-After: {e.retry_after}")
+        return JSONResponse(
+            status_code=429,
+            content={"reply": "Сервис сейчас перегружен, попробуйте отправить сообщение чуть позже."},
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
     return {"reply": reply}
 
 
+@app.get("/api/admission_stats")
+async def admission_stats():
+    return JSONResponse(content=admission.get_stats())
+
+
+@app.get("/api/speculative_stats")
+async def speculative_stats():
+    return JSONResponse(content=get_speculative_stats())
+
+
 @app.get("/history")
 async def get_history(request: Request):
     session_id = request.cookies.get("session_id")
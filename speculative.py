@@ -0,0 +1,145 @@
+import os
+import threading
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+
+from logger_config import logger
+from text_utils import normalize_text, is_confirmation_reply
+
+# === Спекулятивный поиск контекста ===
+
+# Опциональный режим: поиск контекста стартует параллельно с первым шагом агента
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+SPECULATIVE_MIN_LENGTH = 15
+# Доля слов запроса агента, которые должны встречаться в сообщении пользователя, чтобы использовать готовый контекст
+SPECULATIVE_MATCH_THRESHOLD = 0.6
+# Вопросы о вкладах агент решает через GetRates/GetUserInfo, а не через GetContext.
+# Сравниваются основы слов, а не подстроки сообщения («доставка» не должна совпадать со «ставка»)
+DEPOSIT_STEMS = ("вклад", "депоз", "ставк", "балан")
+ACCOUNT_WORDS = {"счет", "счета", "счету", "счетом", "счете", "счетов", "счетам", "счетами", "счетах"}
+
+speculative_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative")
+speculative_slot = ContextVar("speculative_slot", default=None)
+speculative_lock = threading.Lock()
+speculative_stats = {
+    "started": 0,
+    "hits": 0,
+    "misses": 0,
+    "cancelled": 0,
+    "wasted": 0,
+    "errors": 0,
+}
+
+
+def _count_speculative(key: str):
+    with speculative_lock:
+        speculative_stats[key] += 1
+
+
+def query_terms(text: str) -> set:
+    """
+    Значимые слова запроса, обрезанные до основы, чтобы не зависеть от падежных окончаний
+    """
+    return {word[:5] for word in normalize_text(text).split() if len(word) > 2}
+
+
+def is_deposit_message(message: str) -> bool:
+    """
+    Сообщение о вкладах, ставках, балансе или счёте клиента.
+    """
+    words = normalize_text(message).replace("ё", "е").split()
+    return any(word.startswith(DEPOSIT_STEMS) or word in ACCOUNT_WORDS for word in words)
+
+
+def start_speculative_context(message: str, retrieve):
+    """
+    Запускает retrieve(message) в фоне, не дожидаясь решения агента.
+    Возвращает слот текущего хода или None, если спекуляция не нужна.
+    """
+    if not SPECULATIVE_RETRIEVAL:
+        return None
+    if len(message.strip()) < SPECULATIVE_MIN_LENGTH or is_confirmation_reply(message):
+        return None
+    if is_deposit_message(message):
+        return None
+
+    slot = {
+        "terms": query_terms(message),
+        "future": speculative_executor.submit(retrieve, message),
+        "used": False,
+    }
+    _count_speculative("started")
+    logger.info(f"tools | 🔮 Спекулятивный поиск контекста запущен: {message}")
+    return slot
+
+
+def speculative_match(query: str, terms: set) -> bool:
+    """
+    Запрос агента совпадает со спекулятивным, если большая часть его слов есть в сообщении пользователя.
+    """
+    query_words = query_terms(query)
+    if not query_words or not terms:
+        return False
+    return len(query_words & terms) / len(query_words) >= SPECULATIVE_MATCH_THRESHOLD
+
+
+def _claim_slot(slot):
+    """
+    Забирает слот в единоличное владение. Только забравший слот может отменить поиск или прочитать его результат.
+    """
+    with speculative_lock:
+        if slot is None or slot["used"]:
+            return None
+        slot["used"] = True
+        return slot["future"]
+
+
+def _discard_future(future):
+    if future.cancel():
+        _count_speculative("cancelled")
+    else:
+        _count_speculative("wasted")
+
+
+def take_speculative_context(query: str):
+    """
+    Возвращает заранее найденный контекст, если агент запросил его с похожим запросом, иначе None.
+    При несовпадении спекулятивный поиск сразу отменяется, чтобы не идти параллельно с обычным.
+    """
+    slot = speculative_slot.get()
+    future = _claim_slot(slot)
+    if future is None:
+        return None
+
+    if not speculative_match(query, slot["terms"]):
+        _count_speculative("misses")
+        _discard_future(future)
+        return None
+
+    try:
+        context = future.result()
+    except Exception as e:
+        _count_speculative("errors")
+        logger.exception(f"tools | ❌ Ошибка спекулятивного поиска контекста: {e}")
+        return None
+
+    _count_speculative("hits")
+    logger.info(f"tools | 🔮 Использован спекулятивный контекст для запроса: {query}")
+    return context
+
+
+def finish_speculative_context(slot):
+    """
+    Завершает ход: неиспользованный поиск отменяется, а если он уже выполняется — результат отбрасывается.
+    """
+    future = _claim_slot(slot)
+    if future is not None:
+        _discard_future(future)
+
+
+def get_speculative_stats() -> dict:
+    with speculative_lock:
+        stats = dict(speculative_stats)
+    stats["enabled"] = SPECULATIVE_RETRIEVAL
+    stats["hit_rate"] = stats["hits"] / stats["started"] if stats["started"] else 0.0
+    return stats
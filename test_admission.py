@@ -0,0 +1,204 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+class BlockingHandler:
+    """Обработчик-заглушка для агента: первый ход ждёт сигнала release, остальные выполняются сразу."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, message):
+        if not self.calls:
+            self.calls.append(message)
+            self.release.wait(timeout=5)
+        else:
+            self.calls.append(message)
+        return f"ответ: {message}"
+
+
+async def wait_until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("условие не выполнилось вовремя")
+        await asyncio.sleep(0.01)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_confirmation_reply_is_prioritized():
+    async def scenario():
+        handler = BlockingHandler()
+        controller = AdmissionController(handler, queue_max_size=4, workers_count=1)
+        await controller.start()
+
+        first = asyncio.create_task(controller.submit("s1", "Какие есть вклады?"))
+        await wait_until(lambda: controller.in_flight == 1)
+        question = asyncio.create_task(controller.submit("s2", "Чем ОСАГО отличается от КАСКО?"))
+        confirmation = asyncio.create_task(controller.submit("s3", "Да!"))
+        await wait_until(lambda: controller.queue.qsize() == 2)
+
+        handler.release.set()
+        await asyncio.gather(first, question, confirmation)
+        await controller.stop()
+        return handler.calls, controller.get_stats()
+
+    calls, stats = run(scenario())
+    assert calls == ["Какие есть вклады?", "Да!", "Чем ОСАГО отличается от КАСКО?"]
+    assert stats["confirmations_prioritized"] == 1
+    assert stats["completed"] == 3
+
+
+def test_session_busy_rejected():
+    async def scenario():
+        handler = BlockingHandler()
+        controller = AdmissionController(handler, queue_max_size=4, workers_count=1, session_max_pending=1)
+        await controller.start()
+
+        first = asyncio.create_task(controller.submit("s1", "первое"))
+        await wait_until(lambda: controller.in_flight == 1)
+        second = asyncio.create_task(controller.submit("s1", "второе"))
+        await wait_until(lambda: controller.waiting_for_session == 1)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.submit("s1", "третье")
+
+        handler.release.set()
+        replies = await asyncio.gather(first, second)
+        await controller.stop()
+        return excinfo.value, replies, controller.get_stats()
+
+    rejected, replies, stats = run(scenario())
+    assert rejected.reason == "session_busy"
+    assert replies == ["ответ: первое", "ответ: второе"]
+    assert stats["rejected_session_busy"] == 1
+
+
+def test_queue_full_rejected_without_waiting_for_session():
+    async def scenario():
+        handler = BlockingHandler()
+        controller = AdmissionController(handler, queue_max_size=1, workers_count=1)
+        await controller.start()
+
+        first = asyncio.create_task(controller.submit("s1", "первое"))
+        await wait_until(lambda: controller.in_flight == 1)
+        # Ждёт завершения хода своей сессии и занимает единственное место в очереди
+        second = asyncio.create_task(controller.submit("s1", "второе"))
+        await wait_until(lambda: controller.waiting_for_session == 1)
+
+        with pytest.raises(AdmissionRejected) as same_session:
+            await controller.submit("s1", "третье")
+        with pytest.raises(AdmissionRejected) as other_session:
+            await controller.submit("s2", "другая сессия")
+
+        handler.release.set()
+        await asyncio.gather(first, second)
+        await controller.stop()
+        return same_session.value, other_session.value, controller.get_stats()
+
+    same_session, other_session, stats = run(scenario())
+    assert same_session.reason == "queue_full"
+    assert other_session.reason == "queue_full"
+    assert other_session.retry_after == 10
+    assert stats["rejected_queue_full"] == 2
+
+
+def test_stop_rejects_pending_turns():
+    async def scenario():
+        handler = BlockingHandler()
+        controller = AdmissionController(handler, queue_max_size=4, workers_count=1)
+        await controller.start()
+
+        in_flight = asyncio.create_task(controller.submit("s1", "первое"))
+        await wait_until(lambda: controller.in_flight == 1)
+        queued = asyncio.create_task(controller.submit("s2", "второе"))
+        waiting = asyncio.create_task(controller.submit("s1", "третье"))
+        await wait_until(lambda: controller.queue_load() == 2)
+
+        await controller.stop()
+        results = await asyncio.wait_for(
+            asyncio.gather(in_flight, queued, waiting, return_exceptions=True), timeout=2
+        )
+        handler.release.set()
+        return results
+
+    results = run(scenario())
+    assert all(isinstance(r, AdmissionRejected) and r.reason == "stopped" for r in results)
+
+
+def test_stats():
+    async def scenario():
+        controller = AdmissionController(lambda message: message.upper(), queue_max_size=4, workers_count=2)
+        await controller.start()
+        replies = await asyncio.gather(
+            controller.submit("s1", "привет"),
+            controller.submit("s2", "нет"),
+        )
+        stats = controller.get_stats()
+        await controller.stop()
+        return replies, stats
+
+    replies, stats = run(scenario())
+    assert replies == ["ПРИВЕТ", "НЕТ"]
+    assert stats["accepted"] == 2
+    assert stats["completed"] == 2
+    assert stats["failed"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+    assert stats["confirmations_prioritized"] == 1
+    assert stats["wait_time_max"] >= stats["wait_time_avg"] >= 0
+    assert stats["retry_after"] >= 1
+
+
+def test_wait_time_includes_waiting_for_session():
+    async def scenario():
+        handler = BlockingHandler()
+        controller = AdmissionController(handler, queue_max_size=4, workers_count=1)
+        await controller.start()
+
+        first = asyncio.create_task(controller.submit("s1", "первое"))
+        await wait_until(lambda: controller.in_flight == 1)
+        second = asyncio.create_task(controller.submit("s1", "второе"))
+        await wait_until(lambda: controller.waiting_for_session == 1)
+        await asyncio.sleep(0.2)
+
+        handler.release.set()
+        await asyncio.gather(first, second)
+        stats = controller.get_stats()
+        await controller.stop()
+        return stats
+
+    stats = run(scenario())
+    assert stats["wait_time_max"] >= 0.2
+    assert stats["session_wait_time_avg"] >= 0.1
+    assert stats["wait_time_avg"] >= stats["session_wait_time_avg"]
+
+
+def test_error_reply_counted_as_failed():
+    async def scenario():
+        controller = AdmissionController(
+            lambda message: "ошибка" if message == "сбой" else "ок",
+            queue_max_size=4, workers_count=1, error_reply="ошибка",
+        )
+        await controller.start()
+        replies = await asyncio.gather(
+            controller.submit("s1", "сбой"),
+            controller.submit("s2", "вопрос"),
+        )
+        stats = controller.get_stats()
+        await controller.stop()
+        return replies, stats
+
+    replies, stats = run(scenario())
+    assert replies == ["ошибка", "ок"]
+    assert stats["failed"] == 1
+    assert stats["completed"] == 1
@@ -0,0 +1,140 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import speculative
+from speculative import (
+    finish_speculative_context,
+    get_speculative_stats,
+    is_deposit_message,
+    query_terms,
+    speculative_match,
+    speculative_slot,
+    start_speculative_context,
+    take_speculative_context,
+)
+
+
+@pytest.fixture(autouse=True)
+def speculative_enabled(monkeypatch):
+    monkeypatch.setattr(speculative, "SPECULATIVE_RETRIEVAL", True)
+    for key in speculative.speculative_stats:
+        monkeypatch.setitem(speculative.speculative_stats, key, 0)
+
+
+def make_slot(message, future):
+    return {"terms": query_terms(message), "future": future, "used": False}
+
+
+def run_in_turn(slot, func, *args):
+    """Вызывает func в контексте хода с заданным слотом, как это делает get_ai_reply."""
+    context = contextvars.copy_context()
+    context.run(speculative_slot.set, slot)
+    return context.run(func, *args)
+
+
+def test_speculative_match():
+    terms = query_terms("Подскажите, чем ОСАГО отличается от КАСКО?")
+    assert speculative_match("отличия ОСАГО и КАСКО", terms)
+    assert not speculative_match("кредитная карта лимит", terms)
+    assert not speculative_match("", terms)
+
+
+def test_is_deposit_message():
+    assert is_deposit_message("Хочу открыть вклад Мечта на 30 дней")
+    assert is_deposit_message("Переведи деньги на счёт")
+    assert is_deposit_message("Какие сейчас ставки?")
+    assert not is_deposit_message("Сколько стоит доставка карты?")
+    assert not is_deposit_message("Как работает расчет по кредиту и счетчик?")
+
+
+def test_start_skips_short_confirmation_and_deposit_messages():
+    retrieve = lambda message: pytest.fail("поиск не должен запускаться")
+    assert start_speculative_context("да", retrieve) is None
+    assert start_speculative_context("Подтверждаю!!!!!!!!!!!!", retrieve) is None
+    assert start_speculative_context("Хочу открыть вклад Мечта на 30 дней", retrieve) is None
+    assert get_speculative_stats()["started"] == 0
+
+
+def test_hit_returns_prefetched_context():
+    message = "Чем ОСАГО отличается от КАСКО?"
+    slot = start_speculative_context(message, lambda query: ["контекст: " + query])
+
+    assert run_in_turn(slot, take_speculative_context, "отличие осаго от каско") == ["контекст: " + message]
+    finish_speculative_context(slot)
+
+    stats = get_speculative_stats()
+    assert stats["started"] == 1
+    assert stats["hits"] == 1
+    assert stats["cancelled"] == 0 and stats["wasted"] == 0
+    assert stats["hit_rate"] == 1.0
+
+
+def test_miss_cancels_pending_lookup():
+    future = Future()
+    slot = make_slot("Что такое ипотека и как её получить", future)
+
+    assert run_in_turn(slot, take_speculative_context, "кредитная карта лимит") is None
+    assert future.cancelled()
+    finish_speculative_context(slot)
+
+    stats = get_speculative_stats()
+    assert stats["misses"] == 1
+    assert stats["cancelled"] == 1
+    assert stats["wasted"] == 0
+
+
+def test_miss_on_running_lookup_counts_as_wasted():
+    future = Future()
+    future.set_running_or_notify_cancel()
+    slot = make_slot("Что такое ипотека и как её получить", future)
+
+    assert run_in_turn(slot, take_speculative_context, "кредитная карта лимит") is None
+
+    stats = get_speculative_stats()
+    assert stats["misses"] == 1
+    assert stats["wasted"] == 1
+
+
+def test_finish_discards_unused_lookup():
+    pending = make_slot("Что такое ипотека и как её получить", Future())
+    finish_speculative_context(pending)
+    running_future = Future()
+    running_future.set_running_or_notify_cancel()
+    finish_speculative_context(make_slot("Что такое ипотека и как её получить", running_future))
+    finish_speculative_context(None)
+
+    stats = get_speculative_stats()
+    assert stats["cancelled"] == 1
+    assert stats["wasted"] == 1
+
+
+@pytest.mark.parametrize("queries", [
+    ("отличия ОСАГО и КАСКО", "кредитная карта лимит"),
+    ("отличия ОСАГО и КАСКО", "чем ОСАГО отличается от КАСКО"),
+])
+def test_parallel_tool_calls_claim_slot_once(queries):
+    release = threading.Event()
+    slot = start_speculative_context(
+        "Чем ОСАГО отличается от КАСКО?",
+        lambda query: (release.wait(timeout=5), ["контекст"])[1],
+    )
+    barrier = threading.Barrier(len(queries))
+
+    def tool_call(query):
+        barrier.wait()
+        return take_speculative_context(query)
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        futures = [pool.submit(run_in_turn, slot, tool_call, query) for query in queries]
+        release.set()
+        results = [f.result(timeout=5) for f in futures]
+    finish_speculative_context(slot)
+
+    stats = get_speculative_stats()
+    assert stats["errors"] == 0
+    assert stats["hits"] + stats["misses"] == 1
+    assert stats["hit_rate"] <= 1.0
+    assert sum(result is not None for result in results) == stats["hits"]
@@ -0,0 +1,22 @@
+import re
+
+# Короткие ответы на вопрос подтверждения действия
+CONFIRMATION_REPLIES = {
+    "да", "нет", "ага", "угу", "ок", "ok", "yes", "no",
+    "да да", "конечно", "подтверждаю", "отмена", "не надо",
+}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Приводим текст к виду для сравнения: нижний регистр, без пунктуации и лишних пробелов
+    """
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def is_confirmation_reply(message: str) -> bool:
+    """
+    Короткий ответ на вопрос подтверждения («да / нет»).
+    """
+    return normalize_text(message) in CONFIRMATION_REPLIES